@@ -1,50 +1,127 @@
 import streamlit as st
-import json
-import geopandas as gpd
-import pandas as pd
-from io import StringIO
-import jsonschema
-from jsonschema import validate
-import os
+import orjson
+import ijson
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
 
 # Set page title and configuration
 st.set_page_config(page_title="GeoJSON Comparison Tool", layout="wide")
 st.title("GeoJSON Comparison Tool")
 
+# Geometry types that can appear as a top-level GeoJSON object
+_DIRECT_GEOMETRY_TYPES = frozenset({"Point", "LineString", "Polygon", "MultiPoint",
+                                    "MultiLineString", "MultiPolygon", "GeometryCollection"})
+
+# All valid top-level GeoJSON types
+_GEOJSON_TYPES = frozenset({"FeatureCollection", "Feature"}) | _DIRECT_GEOMETRY_TYPES
+
+# Files larger than this are analyzed in a streaming pass instead of
+# being fully parsed into memory
+_STREAM_THRESHOLD = 5 * 1024 * 1024
+
+# FeatureCollections with at least this many features are aggregated
+# columnar-style instead of with a per-feature Python loop
+_VECTORIZE_THRESHOLD = 1000
+
+# Maximum number of features shown in the raw preview expander
+_PREVIEW_FEATURES = 50
+
+# Invariant status messages, lifted so reruns reuse the same string
+# objects instead of re-allocating them
+_MSG_VALID = "✅ Valid GeoJSON structure"
+_MSG_STREAMED = "Large file: analyzed in streaming mode"
+
+# Function to load GeoJSON bytes into a dict
+# (show_spinner=False: called from ingest worker threads, where the
+# spinner has no ScriptRunContext and only logs warnings)
+@st.cache_data(max_entries=8, show_spinner=False)
+def load_geojson(raw):
+    """Parse raw GeoJSON bytes, cached on file content across reruns"""
+    return orjson.loads(raw)
+
+# Function to analyze large GeoJSON without materializing the feature list
+# (show_spinner=False: called from ingest worker threads, see load_geojson)
+@st.cache_data(max_entries=8, show_spinner=False)
+def stream_analyze(raw):
+    """Analyze GeoJSON bytes in a single streaming pass with ijson"""
+    analysis = {"type": "Unknown"}
+    feature_types = Counter()
+    property_keys = set()
+    feature_count = 0
+    geometry_seen = False
+    top_geometry_type = None
+
+    for prefix, event, value in ijson.parse(BytesIO(raw)):
+        if prefix == "type":
+            analysis["type"] = value
+        elif prefix == "features.item" and event == "start_map":
+            geometry_seen = False
+        elif prefix == "features.item.geometry.type":
+            feature_types[value] += 1
+            geometry_seen = True
+        elif prefix == "features.item.properties" and event == "map_key":
+            property_keys.add(value)
+        elif prefix == "features.item" and event == "end_map":
+            # Missing/null geometry counts as Unknown, like analyze_geojson
+            if not geometry_seen:
+                feature_types["Unknown"] += 1
+            feature_count += 1
+        elif prefix == "geometry.type":
+            top_geometry_type = value
+        elif prefix == "properties" and event == "map_key":
+            property_keys.add(value)
+
+    if analysis["type"] == "FeatureCollection":
+        analysis["feature_count"] = feature_count
+        analysis["geometry_types"] = dict(feature_types)
+        analysis["property_keys"] = tuple(sorted(property_keys))
+
+    # For single feature
+    elif analysis["type"] == "Feature":
+        analysis["geometry_type"] = top_geometry_type or "Unknown"
+
+        if property_keys:
+            analysis["property_keys"] = tuple(sorted(property_keys))
+
+    # For direct geometry
+    elif analysis["type"] in _DIRECT_GEOMETRY_TYPES:
+        analysis["geometry_type"] = analysis["type"]
+
+    return analysis
+
+# Function to ingest one file's raw bytes
+def load_and_analyze(raw):
+    """Parse small files fully; stream-analyze large ones"""
+    if len(raw) > _STREAM_THRESHOLD:
+        return None, stream_analyze(raw)
+    return load_geojson(raw), None
+
 # Function to check GeoJSON validity
+@st.cache_data(max_entries=8)
 def validate_geojson(data):
-    """Validate if the provided data conforms to GeoJSON schema"""
+    """Validate if the provided data conforms to GeoJSON structure"""
     try:
-        # Basic GeoJSON schema
-        geojson_schema = {
-            "type": "object",
-            "required": ["type"],
-            "properties": {
-                "type": {"type": "string", "enum": ["FeatureCollection", "Feature", "Point", "LineString", "Polygon", 
-                                                  "MultiPoint", "MultiLineString", "MultiPolygon", "GeometryCollection"]},
-                "features": {"type": "array"},
-                "geometry": {"type": "object"},
-                "properties": {"type": "object"},
-                "coordinates": {"type": "array"}
-            }
-        }
-        
-        validate(instance=data, schema=geojson_schema)
-        
+        if not isinstance(data, dict):
+            return False, "Invalid GeoJSON: document must be a JSON object"
+
+        gj_type = data.get("type")
+        if gj_type not in _GEOJSON_TYPES:
+            return False, f"Invalid GeoJSON: unknown type {gj_type!r}"
+
         # Further validation for specific types
-        if data.get("type") == "FeatureCollection" and "features" not in data:
+        if gj_type == "FeatureCollection" and not isinstance(data.get("features"), list):
             return False, "FeatureCollection must have 'features' array"
-        
-        if data.get("type") == "Feature" and "geometry" not in data:
+
+        if gj_type == "Feature" and "geometry" not in data:
             return False, "Feature must have 'geometry' property"
-            
+
         return True, "Valid GeoJSON"
-    except jsonschema.exceptions.ValidationError as e:
-        return False, f"Invalid GeoJSON: {e.message}"
     except Exception as e:
         return False, f"Error during validation: {str(e)}"
 
 # Function to analyze GeoJSON structure
+@st.cache_data(max_entries=8)
 def analyze_geojson(data):
     """Analyze the structure of a GeoJSON file"""
     analysis = {}
@@ -58,70 +135,172 @@ def analyze_geojson(data):
         analysis["feature_count"] = len(features)
         
         # Feature types
-        feature_types = {}
-        property_keys = set()
-        
-        for feature in features:
-            geo_type = feature.get("geometry", {}).get("type", "Unknown")
-            feature_types[geo_type] = feature_types.get(geo_type, 0) + 1
-            
-            # Collect property keys
-            if "properties" in feature and feature["properties"]:
-                property_keys.update(feature["properties"].keys())
-        
+        if len(features) >= _VECTORIZE_THRESHOLD:
+            # Columnar aggregation: one json_normalize pass plus a
+            # value_counts instead of a per-feature dict walk. Deferred
+            # import so small inputs never pay the pandas/numpy startup cost
+            import pandas as pd
+
+            df = pd.json_normalize(features, max_level=1)
+            if "geometry.type" in df.columns:
+                feature_types = df["geometry.type"].fillna("Unknown").value_counts().to_dict()
+            else:
+                feature_types = {"Unknown": len(features)}
+            property_keys = {col[len("properties."):] for col in df.columns
+                             if col.startswith("properties.")}
+        else:
+            # Feed generators to Counter/set.union so the per-feature loop
+            # body runs in C instead of two dict lookups per feature
+            feature_types = dict(Counter(feature.get("geometry", {}).get("type", "Unknown")
+                                         for feature in features))
+            property_keys = set().union(*(feature["properties"].keys()
+                                          for feature in features if feature.get("properties")))
+
         analysis["geometry_types"] = feature_types
-        analysis["property_keys"] = list(property_keys)
-    
+        analysis["property_keys"] = tuple(sorted(property_keys))
+
     # For single feature
     elif analysis["type"] == "Feature":
         geo_type = data.get("geometry", {}).get("type", "Unknown")
         analysis["geometry_type"] = geo_type
-        
-        if "properties" in data and data["properties"]:
-            analysis["property_keys"] = list(data["properties"].keys())
+
+        props = data.get("properties")
+        if props:
+            analysis["property_keys"] = tuple(sorted(props.keys()))
     
     # For direct geometry
-    elif analysis["type"] in ["Point", "LineString", "Polygon", "MultiPoint", 
-                             "MultiLineString", "MultiPolygon", "GeometryCollection"]:
+    elif analysis["type"] in _DIRECT_GEOMETRY_TYPES:
         analysis["geometry_type"] = analysis["type"]
     
     return analysis
 
-# Function to find differences between two GeoJSON files
-def compare_geojson(geojson1, geojson2):
-    """Compare two GeoJSON files and identify differences"""
+# Function to compute the overall bounding box of a GeoJSON document
+@st.cache_data(max_entries=8)
+def compute_bbox(raw):
+    """Compute (minx, miny, maxx, maxy) over all coordinates in one C pass"""
+    # from_geojson + get_coordinates walk every coordinate in C, instead
+    # of nested Python loops over the ragged coordinate arrays.
+    # validate_geojson is deliberately loose, so GEOS may reject input the
+    # app accepted; ignore those instead of raising and just omit the bbox
+    import shapely
+
+    geom = shapely.from_geojson(raw, on_invalid="ignore")
+    if geom is None:
+        return None
+    coords = shapely.get_coordinates(geom)
+    if coords.size == 0:
+        return None
+    minx, miny = coords.min(axis=0)
+    maxx, maxy = coords.max(axis=0)
+    return float(minx), float(miny), float(maxx), float(maxy)
+
+# Function to pretty-print a capped raw preview
+@st.cache_data(max_entries=8)
+def geojson_preview(data):
+    """Serialize a preview capped at _PREVIEW_FEATURES features"""
+    if data.get("type") == "FeatureCollection" and len(data.get("features", [])) > _PREVIEW_FEATURES:
+        data = {**data, "features": data["features"][:_PREVIEW_FEATURES]}
+    return orjson.dumps(data, option=orjson.OPT_INDENT_2).decode()
+
+# Function to render an analysis as a single markdown blob
+@st.cache_data(max_entries=8)
+def analysis_markdown(analysis):
+    """Build the analysis markdown once per distinct analysis result"""
+    lines = [f"**Type:** {analysis.get('type', 'Unknown')}"]
+
+    if "feature_count" in analysis:
+        lines.append(f"**Feature Count:** {analysis['feature_count']}")
+
+    if "geometry_types" in analysis:
+        lines.append("**Geometry Types:**")
+        lines.append("\n".join(f"- {geo_type}: {count} features"
+                               for geo_type, count in analysis["geometry_types"].items()))
+
+    if "geometry_type" in analysis:
+        lines.append(f"**Geometry Type:** {analysis['geometry_type']}")
+
+    if "property_keys" in analysis:
+        lines.append("**Property Keys:**")
+        lines.append(", ".join(analysis["property_keys"]))
+
+    return "\n\n".join(lines)
+
+# Function to find differences between two GeoJSON analyses
+@st.cache_data(max_entries=8)
+def compare_geojson(analysis1, analysis2):
+    """Compare two GeoJSON analyses and identify differences"""
     differences = {}
-    
+
     # Compare types
-    differences["different_types"] = geojson1.get("type") != geojson2.get("type")
-    
+    differences["different_types"] = analysis1.get("type") != analysis2.get("type")
+
     # Compare feature counts if they are FeatureCollections
-    if geojson1.get("type") == "FeatureCollection" and geojson2.get("type") == "FeatureCollection":
-        features1 = geojson1.get("features", [])
-        features2 = geojson2.get("features", [])
-        
-        differences["feature_count_1"] = len(features1)
-        differences["feature_count_2"] = len(features2)
-        differences["feature_count_diff"] = len(features1) - len(features2)
-        
-        # Compare property keys
-        keys1 = set()
-        keys2 = set()
-        
-        for feature in features1:
-            if "properties" in feature and feature["properties"]:
-                keys1.update(feature["properties"].keys())
-        
-        for feature in features2:
-            if "properties" in feature and feature["properties"]:
-                keys2.update(feature["properties"].keys())
-        
-        differences["unique_keys_1"] = list(keys1 - keys2)
-        differences["unique_keys_2"] = list(keys2 - keys1)
-        differences["common_keys"] = list(keys1.intersection(keys2))
-    
+    if analysis1.get("type") == "FeatureCollection" and analysis2.get("type") == "FeatureCollection":
+        differences["feature_count_1"] = analysis1.get("feature_count", 0)
+        differences["feature_count_2"] = analysis2.get("feature_count", 0)
+        differences["feature_count_diff"] = differences["feature_count_1"] - differences["feature_count_2"]
+
+        # Compare property keys collected during analysis (no extra feature pass)
+        keys1 = frozenset(analysis1.get("property_keys", ()))
+        keys2 = frozenset(analysis2.get("property_keys", ()))
+
+        # Compute the intersection once and subtract it, rather than three
+        # independent passes over both sets; sorted tuples keep the result
+        # deterministic so cache hits survive across reruns
+        common = keys1 & keys2
+        differences["unique_keys_1"] = tuple(sorted(keys1 - common))
+        differences["unique_keys_2"] = tuple(sorted(keys2 - common))
+        differences["common_keys"] = tuple(sorted(common))
+
     return differences
 
+# Function to render one file's analysis column
+def render_analysis(col, data, analysis, raw, upload, label):
+    """Render validity, analysis, bbox and raw preview for one file.
+
+    Returns (valid, analysis); valid is False for streamed files, which
+    keep no parsed tree to validate.
+    """
+    with col:
+        if data is None and analysis is None:
+            return False, analysis
+
+        st.subheader(f"GeoJSON {label} Analysis")
+
+        if data is not None:
+            # Check validity
+            valid, message = validate_geojson(data)
+            if valid:
+                st.success(_MSG_VALID)
+            else:
+                st.error(f"❌ Invalid GeoJSON: {message}")
+
+            # Show analysis
+            analysis = analyze_geojson(data)
+        else:
+            valid = False
+            st.info(_MSG_STREAMED)
+
+        st.markdown(analysis_markdown(analysis))
+
+        # Bounding box (skipped for streamed files, which keep no parsed tree)
+        if data is not None and valid and raw is not None:
+            bbox = compute_bbox(raw)
+            if bbox is not None:
+                st.write("**Bounding Box:** [{:.6g}, {:.6g}, {:.6g}, {:.6g}]".format(*bbox))
+
+        # Show raw data
+        if data is not None:
+            with st.expander(f"View Raw GeoJSON {label}"):
+                if analysis.get("feature_count", 0) > _PREVIEW_FEATURES:
+                    st.caption(f"Preview of the first {_PREVIEW_FEATURES} features")
+                st.code(geojson_preview(data), language="json")
+        elif raw is not None:
+            st.download_button(f"Download Raw GeoJSON {label}", raw,
+                               file_name=upload.name, mime="application/geo+json")
+
+        return valid, analysis
+
 # Create two columns for file uploads
 col1, col2 = st.columns(2)
 
@@ -183,115 +362,66 @@ sample_geojson2 = {
 # Process GeoJSON files
 geojson_data1 = None
 geojson_data2 = None
+analysis1 = None
+analysis2 = None
+raw1 = None
+raw2 = None
 
 if file1 is not None:
-    try:
-        content1 = file1.getvalue().decode("utf-8")
-        geojson_data1 = json.loads(content1)
-    except Exception as e:
-        st.error(f"Error reading file 1: {str(e)}")
+    file1.seek(0)
+    raw1 = file1.read()
 elif sample_data1:
     geojson_data1 = sample_geojson1
+    raw1 = orjson.dumps(sample_geojson1)
 
 if file2 is not None:
-    try:
-        content2 = file2.getvalue().decode("utf-8")
-        geojson_data2 = json.loads(content2)
-    except Exception as e:
-        st.error(f"Error reading file 2: {str(e)}")
+    file2.seek(0)
+    raw2 = file2.read()
 elif sample_data2:
     geojson_data2 = sample_geojson2
+    raw2 = orjson.dumps(sample_geojson2)
+
+# Ingest both uploads concurrently; orjson releases the GIL while
+# parsing, so two independent files overlap instead of running back to back
+with ThreadPoolExecutor(max_workers=2) as executor:
+    future1 = executor.submit(load_and_analyze, raw1) if file1 is not None else None
+    future2 = executor.submit(load_and_analyze, raw2) if file2 is not None else None
+
+    if future1 is not None:
+        try:
+            geojson_data1, analysis1 = future1.result()
+        except Exception as e:
+            st.error(f"Error reading file 1: {str(e)}")
+
+    if future2 is not None:
+        try:
+            geojson_data2, analysis2 = future2.result()
+        except Exception as e:
+            st.error(f"Error reading file 2: {str(e)}")
 
 # Display analysis if both files are loaded
-if geojson_data1 is not None or geojson_data2 is not None:
+if geojson_data1 is not None or geojson_data2 is not None or analysis1 is not None or analysis2 is not None:
     st.divider()
     
     # Analysis columns
     col1, col2 = st.columns(2)
-    
-    with col1:
-        if geojson_data1 is not None:
-            st.subheader("GeoJSON 1 Analysis")
-            
-            # Check validity
-            valid1, message1 = validate_geojson(geojson_data1)
-            if valid1:
-                st.success("✅ Valid GeoJSON structure")
-            else:
-                st.error(f"❌ Invalid GeoJSON: {message1}")
-            
-            # Show analysis
-            analysis1 = analyze_geojson(geojson_data1)
-            
-            st.write("**Type:**", analysis1.get("type", "Unknown"))
-            
-            if "feature_count" in analysis1:
-                st.write("**Feature Count:**", analysis1["feature_count"])
-            
-            if "geometry_types" in analysis1:
-                st.write("**Geometry Types:**")
-                for geo_type, count in analysis1["geometry_types"].items():
-                    st.write(f"- {geo_type}: {count} features")
-            
-            if "geometry_type" in analysis1:
-                st.write("**Geometry Type:**", analysis1["geometry_type"])
-            
-            if "property_keys" in analysis1:
-                st.write("**Property Keys:**")
-                st.write(", ".join(analysis1["property_keys"]))
-            
-            # Show raw data
-            with st.expander("View Raw GeoJSON 1"):
-                st.json(geojson_data1)
-    
-    with col2:
-        if geojson_data2 is not None:
-            st.subheader("GeoJSON 2 Analysis")
-            
-            # Check validity
-            valid2, message2 = validate_geojson(geojson_data2)
-            if valid2:
-                st.success("✅ Valid GeoJSON structure")
-            else:
-                st.error(f"❌ Invalid GeoJSON: {message2}")
-            
-            # Show analysis
-            analysis2 = analyze_geojson(geojson_data2)
-            
-            st.write("**Type:**", analysis2.get("type", "Unknown"))
-            
-            if "feature_count" in analysis2:
-                st.write("**Feature Count:**", analysis2["feature_count"])
-            
-            if "geometry_types" in analysis2:
-                st.write("**Geometry Types:**")
-                for geo_type, count in analysis2["geometry_types"].items():
-                    st.write(f"- {geo_type}: {count} features")
-            
-            if "geometry_type" in analysis2:
-                st.write("**Geometry Type:**", analysis2["geometry_type"])
-            
-            if "property_keys" in analysis2:
-                st.write("**Property Keys:**")
-                st.write(", ".join(analysis2["property_keys"]))
-            
-            # Show raw data
-            with st.expander("View Raw GeoJSON 2"):
-                st.json(geojson_data2)
+
+    valid1, analysis1 = render_analysis(col1, geojson_data1, analysis1, raw1, file1, "1")
+    valid2, analysis2 = render_analysis(col2, geojson_data2, analysis2, raw2, file2, "2")
 
     # Comparison section
-    if geojson_data1 is not None and geojson_data2 is not None:
+    if analysis1 is not None and analysis2 is not None:
         st.divider()
         st.header("GeoJSON Comparison")
-        
-        # Compare the two GeoJSON files
-        comparison = compare_geojson(geojson_data1, geojson_data2)
-        
+
+        # Compare the two GeoJSON analyses
+        comparison = compare_geojson(analysis1, analysis2)
+
         # Display comparison results
         if comparison["different_types"]:
-            st.warning(f"⚠️ Different GeoJSON types: {geojson_data1.get('type')} vs {geojson_data2.get('type')}")
+            st.warning(f"⚠️ Different GeoJSON types: {analysis1.get('type')} vs {analysis2.get('type')}")
         else:
-            st.success(f"✅ Same GeoJSON type: {geojson_data1.get('type')}")
+            st.success(f"✅ Same GeoJSON type: {analysis1.get('type')}")
         
         if "feature_count_diff" in comparison:
             if comparison["feature_count_diff"] == 0:
@@ -306,24 +436,21 @@ if geojson_data1 is not None or geojson_data2 is not None:
             with col1:
                 st.subheader("Unique Keys in GeoJSON 1")
                 if comparison["unique_keys_1"]:
-                    for key in comparison["unique_keys_1"]:
-                        st.write(f"- {key}")
+                    st.write("\n".join(f"- {key}" for key in comparison["unique_keys_1"]))
                 else:
                     st.write("None")
-            
+
             with col2:
                 st.subheader("Common Keys")
                 if comparison["common_keys"]:
-                    for key in comparison["common_keys"]:
-                        st.write(f"- {key}")
+                    st.write("\n".join(f"- {key}" for key in comparison["common_keys"]))
                 else:
                     st.write("None")
-            
+
             with col3:
                 st.subheader("Unique Keys in GeoJSON 2")
                 if comparison["unique_keys_2"]:
-                    for key in comparison["unique_keys_2"]:
-                        st.write(f"- {key}")
+                    st.write("\n".join(f"- {key}" for key in comparison["unique_keys_2"]))
                 else:
                     st.write("None")
         
@@ -331,27 +458,34 @@ if geojson_data1 is not None or geojson_data2 is not None:
         if (valid1 if geojson_data1 is not None else False) and (valid2 if geojson_data2 is not None else False):
             st.divider()
             st.header("GeoJSON Visualization")
-            
-            try:
-                # Convert JSON to GeoDataFrames
-                if geojson_data1 is not None:
-                    gdf1 = gpd.GeoDataFrame.from_features(
-                        geojson_data1["features"] if geojson_data1.get("type") == "FeatureCollection" 
-                        else [geojson_data1] if geojson_data1.get("type") == "Feature"
-                        else []
-                    )
-                    
-                if geojson_data2 is not None:
-                    gdf2 = gpd.GeoDataFrame.from_features(
-                        geojson_data2["features"] if geojson_data2.get("type") == "FeatureCollection" 
-                        else [geojson_data2] if geojson_data2.get("type") == "Feature"
-                        else []
-                    )
-                
-                # Basic visualization placeholder
-                st.write("Visualization would go here in a complete app.")
-                st.write("This would typically use Folium, MapboxGL, or a similar mapping library.")
-                
-            except Exception as e:
-                st.error(f"Error visualizing GeoJSON: {str(e)}")
-                st.write("Could not visualize the GeoJSON files, but analysis is still available above.")
+
+            # Building GeoDataFrames runs shapely geometry construction over
+            # every coordinate, so only do it when a map is actually requested
+            if st.button("Render map"):
+                try:
+                    # Deferred so the geopandas/shapely/pyproj import chain
+                    # is not paid on every cold start
+                    import geopandas as gpd
+
+                    # Convert JSON to GeoDataFrames
+                    if geojson_data1 is not None:
+                        gdf1 = gpd.GeoDataFrame.from_features(
+                            geojson_data1["features"] if geojson_data1.get("type") == "FeatureCollection"
+                            else [geojson_data1] if geojson_data1.get("type") == "Feature"
+                            else []
+                        )
+
+                    if geojson_data2 is not None:
+                        gdf2 = gpd.GeoDataFrame.from_features(
+                            geojson_data2["features"] if geojson_data2.get("type") == "FeatureCollection"
+                            else [geojson_data2] if geojson_data2.get("type") == "Feature"
+                            else []
+                        )
+
+                    # Basic visualization placeholder
+                    st.write("Visualization would go here in a complete app.")
+                    st.write("This would typically use Folium, MapboxGL, or a similar mapping library.")
+
+                except Exception as e:
+                    st.error(f"Error visualizing GeoJSON: {str(e)}")
+                    st.write("Could not visualize the GeoJSON files, but analysis is still available above.")